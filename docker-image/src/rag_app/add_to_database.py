@@ -1,11 +1,18 @@
 import argparse
+import asyncio
+import functools
+import glob
+import itertools
 import os
 import shutil
+import subprocess
 import logging
-from langchain_community.document_loaders.pdf import PyPDFDirectoryLoader
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders.pdf import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from rag_app.utils import get_embedding_function
+from tokenizers import Tokenizer
+from rag_app.utils import get_embedding_function, content_hash, COLLECTION_METADATA
 from langchain_chroma import Chroma
 
 # Configure logging
@@ -14,6 +21,13 @@ logger = logging.getLogger(__name__)
 
 DATA_PATH = "src/data/source"
 DATABASE_PATH = "src/data/chroma"
+TOKENIZER_MODEL = "bert-base-uncased"
+# About 800-1000 characters of English, keeping chunks well under Cohere embed's
+# 2048 character limit and the k=5 context within Titan Text Lite's 4K window
+CHUNK_SIZE = 200  # Tokens
+CHUNK_OVERLAP = 20  # Tokens
+BATCH_SIZE = 128  # Chroma recommends inserting in batches of roughly 100-250
+EMBEDDING_CONCURRENCY = 4  # Number of batches being embedded at once
 
 def main():
     # Check if the database should be cleared (using the --reset flag).
@@ -24,64 +38,137 @@ def main():
         logger.info("Clearing Database")
         clear_database()
 
-    documents = load_documents()
-    chunks = chunk_documents(documents)
+    chunks = load_and_chunk_documents()
     add_to_database(chunks)
 
 
 # TODO add other document types here
 # https://python.langchain.com/docs/integrations/document_loaders/
-def load_documents():
-    document_loader = PyPDFDirectoryLoader(DATA_PATH)
-    return document_loader.load()
+def load_and_chunk_documents():
+    """Parse and chunk every PDF in DATA_PATH and its subfolders, one file per worker process."""
+    paths = sorted(glob.glob(os.path.join(DATA_PATH, "**", "*.pdf"), recursive=True))
+    logger.info(f"Loading {len(paths)} PDF files from {DATA_PATH}")
+    if not paths:
+        return []
+
+    with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as executor:
+        return list(itertools.chain.from_iterable(executor.map(load_and_chunk, paths)))
+
+
+def load_and_chunk(path: str):
+    document_loader = PyPDFLoader(path)
+    return chunk_documents(document_loader.load())
+
+
+@functools.cache
+def get_tokenizer():
+    return Tokenizer.from_pretrained(TOKENIZER_MODEL)
+
+
+def token_length(text: str) -> int:
+    return len(get_tokenizer().encode(text, add_special_tokens=False).ids)
 
 
 def chunk_documents(documents: list[Document]):
+    # Measure chunks in tokens rather than characters so the context sent to the LLM packs tightly
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=80,
-        length_function=len,
-        is_separator_regex=False
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=token_length,
+        is_separator_regex=False,
+        separators=["\n\n", "\n", " ", ""],
     )
     return text_splitter.split_documents(documents)
 
 
 def add_to_database(chunks: list[Document]):
+    embedding_function = get_embedding_function()
     db = Chroma(
         persist_directory=DATABASE_PATH,
-        embedding_function=get_embedding_function()
+        embedding_function=embedding_function,
+        collection_metadata=COLLECTION_METADATA,
     )
 
-    logger.debug(f"Using embedding function: {get_embedding_function()}")
-
-    # Only add documents that don't exist in the DB.
-    # update to store the hash of the content in the metadata as well, then we can see if the content has changed
+    logger.debug(f"Using embedding function: {embedding_function}")
 
+    # Only add documents that don't exist in the DB, and replace those whose content has changed.
     chunks_with_ids = calculate_chunk_ids(chunks)
 
-    existing_items = db.get(include=[])  # IDs are always included by default
-    existing_ids = set(existing_items["ids"])
-    logger.info(f"Number of existing documents in DB: {len(existing_ids)}")
+    existing_items = db.get(include=["metadatas"])  # IDs are always included by default
+    existing_hashes = {
+        item_id: (metadata or {}).get("content_hash")
+        for item_id, metadata in zip(existing_items["ids"], existing_items["metadatas"])
+    }
+    logger.info(f"Number of existing documents in DB: {len(existing_hashes)}")
 
+    # Stores built before content hashes were recorded have None here, so every chunk
+    # in them counts as changed and is re-embedded once on the next run.
     new_chunks = []
+    changed_chunks = []
     for chunk in chunks_with_ids:
-        if chunk.metadata["id"] not in existing_ids:
+        chunk_id = chunk.metadata["id"]
+        if chunk_id not in existing_hashes:
             new_chunks.append(chunk)
+        elif existing_hashes[chunk_id] != chunk.metadata["content_hash"]:
+            changed_chunks.append(chunk)
+
+    if len(changed_chunks):
+        logger.info(f"Updating changed documents: {len(changed_chunks)}")
+        db.delete(ids=[chunk.metadata["id"] for chunk in changed_chunks])
+        add_in_batches(db, changed_chunks)
 
     if len(new_chunks):
         logger.info(f"Adding new documents: {len(new_chunks)}")
-        new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
-        db.add_documents(new_chunks, ids=new_chunk_ids)
-    else:
+        add_in_batches(db, new_chunks)
+    elif not len(changed_chunks):
         logger.info("No new documents to add")
 
 
+def add_in_batches(db, chunks: list[Document]):
+    """Add chunks to the DB in fixed-size batches.
+
+    Embeddings are computed for up to EMBEDDING_CONCURRENCY batches at once, and each
+    batch is written to Chroma as soon as its embeddings are ready. A failed batch is
+    logged and skipped so one bad batch doesn't abort the whole ingest.
+    """
+    asyncio.run(_add_in_batches(db, chunks))
+
+
+async def _add_in_batches(db, chunks: list[Document]):
+    embedding_function = db.embeddings
+    semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
+    async def _add_batch(start: int, batch: list[Document]):
+        try:
+            async with semaphore:
+                embeddings = await embedding_function.aembed_documents(
+                    [chunk.page_content for chunk in batch]
+                )
+            # Embeddings are precomputed, so write to the collection directly rather than re-embedding
+            db._collection.add(
+                ids=[chunk.metadata["id"] for chunk in batch],
+                embeddings=embeddings,
+                documents=[chunk.page_content for chunk in batch],
+                metadatas=[chunk.metadata for chunk in batch],
+            )
+            logger.debug(f"Added batch {start // BATCH_SIZE + 1}: {len(batch)} chunks")
+        except Exception as e:
+            logger.error(f"Error adding batch starting at chunk {start}: {str(e)}")
+
+    await asyncio.gather(*[
+        _add_batch(i, chunks[i:i + BATCH_SIZE])
+        for i in range(0, len(chunks), BATCH_SIZE)
+    ])
+
+
 def calculate_chunk_ids(chunks):
     ''' 
     Create IDs in form 
     Page Source : Page Number : Chunk Index
 
     example: "data/monopoly.pdf:6:2"
+
+    Also stores a hash of the chunk content so changed chunks can be detected.
     
     :param chunks: the chunks to generate an ID for
     '''
@@ -106,13 +193,20 @@ def calculate_chunk_ids(chunks):
 
         # Add it to the page meta-data.
         chunk.metadata["id"] = chunk_id
+        chunk.metadata["content_hash"] = content_hash(chunk.page_content)
 
     return chunks
 
 
 def clear_database():
-    if os.path.exists(DATABASE_PATH):
-        shutil.rmtree(DATABASE_PATH)
+    if not os.path.isdir(DATABASE_PATH):
+        return
+
+    # rm -rf avoids shutil.rmtree's per-file Python overhead on large stores
+    if os.name == "posix" and shutil.which("rm"):
+        if subprocess.run(["rm", "-rf", DATABASE_PATH], check=False).returncode == 0:
+            return
+    shutil.rmtree(DATABASE_PATH, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,29 @@
 import argparse
+import orjson
 import logging
-from langchain.prompts import ChatPromptTemplate
-from langchain_ollama import OllamaLLM
-from langchain_aws import ChatBedrock
-from dataclasses import dataclass
-from rag_app.utils import get_chroma_db
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from rag_app.utils import get_chroma_collection, get_embedding_function, get_bedrock_client_config
+from rag_app.query_cache import QueryCache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+MODEL_ID = "amazon.titan-text-lite-v1"
+TOP_K = 5
+FETCH_K = 20  # Candidates fetched for MMR re-ranking
+MMR_LAMBDA = 0.5
+
+MAX_QUERY_WORKERS = 16  # Should not exceed the bedrock-runtime connection pool size
+
+BEDROCK_CLIENT = None  # Reference to singleton bedrock-runtime client
+BEDROCK_CLIENT_LOCK = threading.Lock()
+IS_WARMED_UP = False
+QUERY_CACHE = QueryCache(exact_size=1024, semantic_size=10_000, threshold=0.97)
+
 
 PROMPT_TEMPLATE = """
 You are a helpful RAG assistant. Answer the user's question *using only the provided context*. 
@@ -46,69 +59,69 @@ class QueryResponse:
     sources: list[str]
 
 
-def build_chain(db):
-    """Builds an LCEL pipeline that:
-       - runs similarity_search_with_score(k=5)
-       - formats context
-       - calls Titan via Bedrock
-       - returns both response_text and sources
-    """
-
-    def _search_with_scores(query: str):
-        return db.as_retriever(
-            search_type="mmr",
-            search_kwargs={
-                "k": 5,
-            },
-        )
-
-    retrieve = RunnableLambda(_search_with_scores)
+def get_bedrock_client():
+    """Build the bedrock-runtime client once so its connection pool is reused across queries."""
+    global BEDROCK_CLIENT
+    if BEDROCK_CLIENT is None:
+        with BEDROCK_CLIENT_LOCK:
+            if BEDROCK_CLIENT is None:
+                # deferred import
+                import boto3
 
-    def _format_context(results):
-        return "\n\n---\n\n".join(doc.page_content for doc in results)
+                BEDROCK_CLIENT = boto3.client(
+                    "bedrock-runtime",
+                    region_name=os.environ.get("AWS_DEFAULT_REGION", "eu-west-2"),
+                    config=get_bedrock_client_config(),
+                )
+    return BEDROCK_CLIENT
 
-    format_context = RunnableLambda(_format_context)
 
-    # Extract source IDs from metadata
-    def _extract_sources(results):
-        return [doc.metadata.get("id", None) for doc in results]
+def retrieve(embedding: list[float]):
+    """Run an MMR search (k=5) directly against the Chroma collection.
 
-    extract_sources = RunnableLambda(_extract_sources)
-
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    # model = OllamaLLM(model="mistral")
-    model = ChatBedrock(model_id="amazon.titan-text-lite-v1")
-    to_str = StrOutputParser()
+    Returns the matching documents and their metadatas.
+    """
+    # deferred import
+    from langchain_chroma.vectorstores import maximal_marginal_relevance
 
-    response_chain = (
-        {
-            "context": retrieve | format_context,
-            "question": RunnablePassthrough(),  # pass the original query string through
-        }
-        | prompt
-        | model
-        | to_str
+    results = get_chroma_collection().query(
+        query_embeddings=[embedding],
+        n_results=FETCH_K,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    documents = results["documents"][0]
+    metadatas = results["metadatas"][0]
+    if not documents:
+        return [], []
+
+    selected = maximal_marginal_relevance(
+        np.array(embedding, dtype=np.float32),
+        results["embeddings"][0],
+        k=TOP_K,
+        lambda_mult=MMR_LAMBDA,
     )
+    return [documents[i] for i in selected], [metadatas[i] for i in selected]
 
-    sources_chain = retrieve | extract_sources
 
-    combined = RunnableParallel(
-        response_text=response_chain,
-        sources=sources_chain,
+def invoke_model(prompt: str) -> str:
+    """Call Titan via Bedrock with the prompt in its User/Bot chat format."""
+    response = get_bedrock_client().invoke_model(
+        modelId=MODEL_ID,
+        body=orjson.dumps({"inputText": f"\n\nUser: {prompt}\n\nBot:"}),
     )
-    return combined
+    body = orjson.loads(response["body"].read())
+    return body["results"][0]["outputText"]
 
 
-def query_rag(query_text: str) -> QueryResponse:
-    db = get_chroma_db()
-    chain = build_chain(db)
+def answer_query(query_text: str, embedding: list[float]) -> QueryResponse:
+    """Retrieve context for the query and answer it with the LLM, without touching the cache."""
+    documents, metadatas = retrieve(embedding)
 
-    result = chain.invoke(query_text)  # {'response_text': str, 'sources': List[str]}
-    response_text = result["response_text"]
-    sources = result["sources"]
+    sources = [(metadata or {}).get("id", None) for metadata in metadatas]
+    context_text = "\n\n---\n\n".join(documents)
 
-    logger.info(f"Query processed successfully: {len(response_text)} chars, {len(sources)} sources")
-    logger.debug(f"Response: {response_text}\nSources: {sources}")
+    prompt = PROMPT_TEMPLATE.format(context=context_text, question=query_text)
+    response_text = invoke_model(prompt)
 
     return QueryResponse(
         query_text=query_text,
@@ -117,11 +130,81 @@ def query_rag(query_text: str) -> QueryResponse:
     )
 
 
+def warm_up():
+    """Run one query end to end so the first real request doesn't pay for
+    reading the HNSW index from disk or opening the Bedrock connections.
+
+    Bypasses the query cache, and only runs once per process.
+    """
+    global IS_WARMED_UP
+    if IS_WARMED_UP:
+        return
+
+    try:
+        answer_query("warmup", get_embedding_function().embed_query("warmup"))
+        IS_WARMED_UP = True
+        logger.info("RAG query path warmed up")
+    except Exception as e:
+        logger.warning(f"Warm up failed, continuing without it: {str(e)}")
+
+
+def query_rag(query_text: str) -> QueryResponse:
+    return query_rag_many([query_text])[0]
+
+
+def query_rag_many(query_texts: list[str]) -> list[QueryResponse]:
+    """Answer several queries, embedding all of the uncached ones in one batch."""
+    # Duplicate queries share one embedding, search and LLM call
+    unique_texts = list(dict.fromkeys(query_texts))
+    if len(unique_texts) < len(query_texts):
+        logger.info(f"Deduplicated {len(query_texts)} queries to {len(unique_texts)}")
+
+    responses = {}
+    for query_text in unique_texts:
+        cached = QUERY_CACHE.get_exact(query_text)
+        if cached:
+            logger.info("Query served from exact cache")
+            responses[query_text] = cached
+
+    # The same embedding is used for the semantic cache lookup and the retrieval
+    uncached = [query_text for query_text in unique_texts if query_text not in responses]
+    embeddings = get_embedding_function().embed_queries(uncached) if uncached else []
+
+    # Each query is independent network-bound work, so answer them concurrently
+    jobs = dict(zip(uncached, embeddings))
+    if len(jobs) == 1:
+        # A single query (the /submit_query case) doesn't need a thread pool
+        responses[uncached[0]] = _query_with_embedding(uncached[0], embeddings[0])
+    elif jobs:
+        with ThreadPoolExecutor(max_workers=min(len(jobs), MAX_QUERY_WORKERS)) as executor:
+            results = executor.map(_query_with_embedding, jobs.keys(), jobs.values())
+            responses.update(zip(jobs.keys(), results))
+
+    return [responses[query_text] for query_text in query_texts]
+
+
+def _query_with_embedding(query_text: str, embedding: list[float]) -> QueryResponse:
+    cached = QUERY_CACHE.get_similar(embedding)
+    if cached:
+        logger.info("Query served from semantic cache")
+        return replace(cached, query_text=query_text)
+
+    query_response = answer_query(query_text, embedding)
+    response_text = query_response.response_text
+    sources = query_response.sources
+
+    logger.info(f"Query processed successfully: {len(response_text)} chars, {len(sources)} sources")
+    logger.debug(f"Response: {response_text}\nSources: {sources}")
+
+    QUERY_CACHE.put(query_text, embedding, query_response)
+    return query_response
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("query_text", type=str, help="The query text.")
+    parser.add_argument("query_text", type=str, nargs="+", help="The query text(s).")
     args = parser.parse_args()
-    query_rag(args.query_text)
+    query_rag_many(args.query_text)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """Two-level cache of query responses.
+
+    - Exact: LRU keyed on the query text, no embedding needed.
+    - Semantic: cosine similarity against the embeddings of previous queries,
+      so near-duplicate questions reuse an earlier answer.
+    """
+
+    def __init__(self, exact_size: int = 1024, semantic_size: int = 10_000, threshold: float = 0.97):
+        self.exact_size = exact_size
+        self.semantic_size = semantic_size
+        self.threshold = threshold
+        self._exact = OrderedDict()
+        self._vectors = None  # [semantic_size, dim] normalized embeddings, allocated on first put
+        self._responses = []
+        self._last_used = np.zeros(semantic_size, dtype=np.int64)
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get_exact(self, query_text: str):
+        with self._lock:
+            response = self._exact.get(query_text)
+            if response is not None:
+                self._exact.move_to_end(query_text)
+            return response
+
+    def get_similar(self, embedding):
+        with self._lock:
+            if not self._responses:
+                return None
+
+            vector = _normalize(embedding)
+            scores = self._vectors[:len(self._responses)] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            logger.debug(f"Semantic cache hit with similarity {scores[best]:.3f}")
+            self._clock += 1
+            self._last_used[best] = self._clock
+            return self._responses[best]
+
+    def put(self, query_text: str, embedding, response):
+        with self._lock:
+            self._exact[query_text] = response
+            self._exact.move_to_end(query_text)
+            if len(self._exact) > self.exact_size:
+                self._exact.popitem(last=False)
+
+            if embedding is None:
+                return
+
+            vector = _normalize(embedding)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.semantic_size, len(vector)), dtype=np.float32)
+
+            if len(self._responses) < self.semantic_size:
+                slot = len(self._responses)
+                self._responses.append(response)
+            else:
+                # Evict the least recently used entry
+                slot = int(np.argmin(self._last_used))
+                self._responses[slot] = response
+
+            self._vectors[slot] = vector
+            self._clock += 1
+            self._last_used[slot] = self._clock
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._vectors = None
+            self._responses = []
+            self._last_used[:] = 0
+            self._clock = 0
+
+
+def _normalize(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
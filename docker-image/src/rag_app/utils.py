@@ -1,31 +1,300 @@
-from langchain_aws.embeddings.bedrock import BedrockEmbeddings
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+import asyncio
+import contextlib
+import functools
+import hashlib
+import httpx
+import orjson
 import os
 import sys
 import shutil
+import sqlite3
+import threading
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# boto3, botocore and chromadb are slow to import, so the API's import path doesn't load them.
+# They are imported inside the functions that use them (marked "deferred import") here and in query.py.
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 CHROMA_DB_INSTANCE = None  # Reference to singleton instance of ChromaDB
+EMBEDDING_FUNCTION = None  # Reference to singleton embedding function
+INIT_LOCK = threading.RLock()  # Guards singleton initialization; re-entrant as get_chroma_db builds the embedder
 CHROMA_PATH = os.environ.get("CHROMA_PATH", "src/data/chroma")
-IS_USING_IMAGE_RUNTIME = bool(os.environ.get("IS_USING_IMAGE_RUNTIME", False))
+IS_USING_IMAGE_RUNTIME = os.environ.get("IS_USING_IMAGE_RUNTIME", "").lower() in ("1", "true", "yes")
+COPY_WORKERS = 8  # Threads used when copying the DB to the runtime path
+# A shared store (e.g. an EFS mount) that is opened in place, skipping the copy to /tmp
+CHROMA_READONLY_PATH = os.environ.get("CHROMA_READONLY_PATH")
+if CHROMA_READONLY_PATH:
+    RUNTIME_CHROMA_PATH = CHROMA_READONLY_PATH
+elif IS_USING_IMAGE_RUNTIME:
+    RUNTIME_CHROMA_PATH = f"/tmp/{CHROMA_PATH}"
+else:
+    RUNTIME_CHROMA_PATH = CHROMA_PATH
+BEDROCK_HEALTHCHECK = os.environ.get("BEDROCK_HEALTHCHECK") == "1"
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", ".embedcache.sqlite3")
+# HNSW settings only take effect when the collection is first created (run add_to_database --reset)
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 32,  # Must stay >= the MMR fetch_k (20) used by the retriever
+}
+COHERE_MAX_TEXTS = 96  # Cohere embed accepts at most 96 texts per request
+INFINITY_URL = os.environ.get("INFINITY_URL")  # e.g. http://infinity:7997, unset to use Bedrock
+INFINITY_MODEL = os.environ.get("INFINITY_MODEL", "nomic-ai/nomic-embed-text-v1.5")
+# Task prefixes the default nomic model expects; set both to "" for models that don't use them
+INFINITY_DOCUMENT_PREFIX = os.environ.get("INFINITY_DOCUMENT_PREFIX", "search_document: ")
+INFINITY_QUERY_PREFIX = os.environ.get("INFINITY_QUERY_PREFIX", "search_query: ")
+
+
+@functools.cache
+def get_bedrock_client_config():
+    """Keep connections alive and pooled across calls, with adaptive retries for throttling."""
+    # deferred import
+    from botocore.config import Config
+
+    return Config(
+        retries={"mode": "adaptive", "max_attempts": 5},
+        tcp_keepalive=True,
+        max_pool_connections=32,
+    )
+
+
+def content_hash(*parts: str) -> str:
+    """Hash one or more strings (NUL separated) for use as a chunk hash or cache key.
+
+    blake2b is in the standard library and considerably faster than SHA-256 on chunk-sized text.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for i, part in enumerate(parts):
+        if i:
+            hasher.update(b"\0")
+        hasher.update(part.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed disk cache in front of another embeddings model.
+
+    Document embeddings are keyed by a hash of the text and model id, so
+    unchanged chunks are never re-embedded on a later ingest. Query
+    embeddings are kept in a small in-memory LRU.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_id: str, cache_path: str = EMBEDDING_CACHE_PATH):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.cache_path = cache_path
+        self._query_cache = OrderedDict()
+        self._query_cache_size = 1024
+        self._query_cache_lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return content_hash(text, self.model_id)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.cache_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        return conn
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        # The connection's context manager only commits, so close it explicitly
+        with contextlib.closing(self._connect()) as conn, conn:
+            cached = {}
+            unique_keys = list(set(keys))
+            # Stay well under sqlite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                cached.update((key, orjson.loads(vector)) for key, vector in rows)
+
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in cached:
+                    missing.setdefault(key, text)
+
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+            if missing:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+                computed = dict(zip(missing.keys(), vectors))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, orjson.dumps(vector)) for key, vector in computed.items()],
+                )
+                cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed several queries, in a single request if the underlying model supports it."""
+        with self._query_cache_lock:
+            found = {}
+            for text in texts:
+                if text in self._query_cache:
+                    self._query_cache.move_to_end(text)
+                    found[text] = self._query_cache[text]
+
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            if hasattr(self.embeddings, "embed_queries"):
+                vectors = self.embeddings.embed_queries(missing)
+            else:
+                vectors = [self.embeddings.embed_query(text) for text in missing]
+
+            with self._query_cache_lock:
+                for text, vector in zip(missing, vectors):
+                    self._query_cache[text] = vector
+                    found[text] = vector
+                while len(self._query_cache) > self._query_cache_size:
+                    self._query_cache.popitem(last=False)
+
+        return [list(found[text]) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_queries([text])[0]
+
+
+class CohereBedrockEmbeddings(Embeddings):
+    """Calls Cohere embed models on Bedrock directly with invoke_model.
+
+    Uses input_type "search_document" for documents and "search_query" for queries,
+    and sends up to COHERE_MAX_TEXTS texts per request.
+    """
+
+    def __init__(self, client, model_id: str):
+        self.client = client
+        self.model_id = model_id
+
+    def _embed(self, texts: list[str], input_type: str) -> list[list[float]]:
+        vectors = []
+        for i in range(0, len(texts), COHERE_MAX_TEXTS):
+            response = self.client.invoke_model(
+                modelId=self.model_id,
+                # Truncate rather than fail the whole batch if one text is over the token limit
+                body=orjson.dumps(
+                    {"texts": texts[i:i + COHERE_MAX_TEXTS], "input_type": input_type, "truncate": "END"}
+                ),
+                accept="application/json",
+                contentType="application/json",
+            )
+            vectors.extend(orjson.loads(response["body"].read())["embeddings"])
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "search_document")
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "search_query")
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_queries([text])[0]
+
+
+class InfinityEmbeddings(Embeddings):
+    """Client for an Infinity (or TEI) embedding server.
+
+    The server batches requests dynamically, so documents are sent as several
+    concurrent sub-batches rather than one text at a time. Documents and queries
+    get the task prefixes the model was trained with.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model_id: str,
+        document_prefix: str = INFINITY_DOCUMENT_PREFIX,
+        query_prefix: str = INFINITY_QUERY_PREFIX,
+        batch_size: int = 256,
+        timeout: float = 60.0,
+        transport=None,  # e.g. an httpx.MockTransport, used for both the sync and async clients
+    ):
+        self.url = f"{base_url.rstrip('/')}/embeddings"
+        self.model_id = model_id
+        self.document_prefix = document_prefix
+        self.query_prefix = query_prefix
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.transport = transport
+
+    def _parse(self, response: httpx.Response) -> list[list[float]]:
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        texts = [self.document_prefix + text for text in texts]
+        async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+
+            async def _embed_batch(batch: list[str]) -> list[list[float]]:
+                response = await client.post(self.url, json={"model": self.model_id, "input": batch})
+                return self._parse(response)
+
+            batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+            results = await asyncio.gather(*[_embed_batch(batch) for batch in batches])
+
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return asyncio.run(self.aembed_documents(texts))
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        texts = [self.query_prefix + text for text in texts]
+        with httpx.Client(timeout=self.timeout, transport=self.transport) as client:
+            response = client.post(self.url, json={"model": self.model_id, "input": texts})
+        return self._parse(response)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_queries([text])[0]
+
 
 def get_embedding_function():
-    """Get embedding function using AWS Bedrock with configured credentials"""
+    """Get embedding function using AWS Bedrock with configured credentials.
+
+    If INFINITY_URL is set, a self-hosted Infinity/TEI server is used instead.
+    The same embedder must be used for ingest and querying.
+    The embedding function is built once and reused for the life of the process.
+    """
+    global EMBEDDING_FUNCTION
+    if EMBEDDING_FUNCTION is None:
+        with INIT_LOCK:
+            if EMBEDDING_FUNCTION is None:
+                EMBEDDING_FUNCTION = build_embedding_function()
+    return EMBEDDING_FUNCTION
+
+
+def build_embedding_function():
+    if INFINITY_URL:
+        logger.info(f"Using Infinity embeddings at {INFINITY_URL} ({INFINITY_MODEL})")
+        # The document prefix changes the vectors, so it is part of the cache key
+        return CachedEmbeddings(
+            InfinityEmbeddings(INFINITY_URL, INFINITY_MODEL),
+            f"{INFINITY_MODEL}|{INFINITY_DOCUMENT_PREFIX}",
+        )
+
+    # deferred import
+    import boto3
+
     region = os.environ.get("AWS_DEFAULT_REGION", "eu-west-2")
 
+    model_id = "cohere.embed-english-v3"
+
     try:
-        embeddings = BedrockEmbeddings(
-            model_id="cohere.embed-english-v3",
-            region_name=region
-        )
-        # Test the connection
-        embeddings.embed_query("test")
-        logger.info("Successfully connected to AWS Bedrock embeddings")
-        return embeddings
+        client = boto3.client("bedrock-runtime", region_name=region, config=get_bedrock_client_config())
+        embeddings = CohereBedrockEmbeddings(client, model_id)
+        # Probing costs a Bedrock round-trip on every cold start, so only do it on request.
+        # Otherwise credential errors surface on the first real query.
+        if BEDROCK_HEALTHCHECK:
+            embeddings.embed_query("test")
+            logger.info("Successfully connected to AWS Bedrock embeddings")
+        return CachedEmbeddings(embeddings, model_id)
     except Exception as e:
         logger.error(f"AWS Bedrock embeddings error: {str(e)}")
         raise e
@@ -33,47 +302,107 @@ def get_embedding_function():
 
 def get_chroma_db():
     global CHROMA_DB_INSTANCE
-    if not CHROMA_DB_INSTANCE:
+    if CHROMA_DB_INSTANCE is None:
+        # Double-checked so concurrent callers don't each build a Chroma instance
+        with INIT_LOCK:
+            if CHROMA_DB_INSTANCE is None:
+                CHROMA_DB_INSTANCE = build_chroma_db()
+    return CHROMA_DB_INSTANCE
+
+
+def build_chroma_db():
+    # deferred import
+    from langchain_chroma import Chroma
+
+    if logger.isEnabledFor(logging.DEBUG):
         logger.debug("get_chroma_db() starting")
         logger.debug(f"CHROMA_PATH (env): {CHROMA_PATH}")
         logger.debug(f"IS_USING_IMAGE_RUNTIME: {IS_USING_IMAGE_RUNTIME}")
-        if IS_USING_IMAGE_RUNTIME:
-            copy_chroma_to_tmp()
+    if IS_USING_IMAGE_RUNTIME and not CHROMA_READONLY_PATH:
+        copy_chroma_to_tmp()
 
-        runtime_path = get_runtime_chroma_path()
+    runtime_path = get_runtime_chroma_path()
 
-        # Prepare the DB.
-        CHROMA_DB_INSTANCE = Chroma(
-            persist_directory=runtime_path,
-            embedding_function=get_embedding_function(),
-        )
+    # Prepare the DB.
+    db = Chroma(
+        persist_directory=runtime_path,
+        embedding_function=get_embedding_function(),
+        collection_metadata=COLLECTION_METADATA,
+    )
 
-        logger.info(f"Initialized ChromaDB from {runtime_path}")
+    logger.info(f"Initialized ChromaDB from {runtime_path}")
+    if logger.isEnabledFor(logging.DEBUG):
         try:
-            items = CHROMA_DB_INSTANCE.get(include=[])
-            ids = items.get("ids", [])
-            logger.info(f"Loaded {len(ids)} documents from ChromaDB")
+            logger.debug(f"Loaded {db._collection.count()} documents from ChromaDB")
         except Exception as e:
             logger.error(f"Error querying ChromaDB on init: {e}")
 
-    return CHROMA_DB_INSTANCE
+    return db
+
+
+def get_chroma_collection():
+    """Native chromadb collection behind the langchain wrapper, for the query hot path."""
+    return get_chroma_db()._collection
+
 
 def copy_chroma_to_tmp():
+    """Copy the DB to the writable runtime path, unless an up to date copy is already there.
+
+    A sentinel file records the source mtime once the copy has completed, so a partial
+    copy or a copy of an older image is replaced rather than reused.
+    """
     dst_chroma_path = get_runtime_chroma_path()
+    sentinel_path = os.path.join(dst_chroma_path, ".copied_from_mtime")
+    source_mtime = str(os.path.getmtime(CHROMA_PATH))
+
+    try:
+        with open(sentinel_path) as f:
+            if f.read() == source_mtime:
+                logger.info(f"ChromaDB already exists in {dst_chroma_path}")
+                return
+    except OSError:
+        pass
 
-    if not os.path.exists(dst_chroma_path):
-        os.makedirs(dst_chroma_path)
+    logger.info(f"Copying ChromaDB from {CHROMA_PATH} to {dst_chroma_path}")
+    shutil.rmtree(dst_chroma_path, ignore_errors=True)
+    link_or_copy_tree(CHROMA_PATH, dst_chroma_path)
+    with open(sentinel_path, "w") as f:
+        f.write(source_mtime)
+
+
+def link_or_copy_tree(src_path: str, dst_path: str):
+    """Hardlink the immutable index files and copy the files Chroma writes to at runtime.
+
+    Falls back to a real copy when hardlinking fails (e.g. /tmp is on another device).
+    Files are processed on a thread pool to overlap the per-file syscall latency.
+    """
+    files = []
+    for src_dir, _, names in os.walk(src_path):
+        dst_dir = os.path.join(dst_path, os.path.relpath(src_dir, src_path))
+        os.makedirs(dst_dir, exist_ok=True)
+        for name in names:
+            files.append((os.path.join(src_dir, name), os.path.join(dst_dir, name)))
+
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        # list() so any copy error is raised here
+        list(executor.map(lambda paths: _link_or_copy_file(*paths), files))
+
+
+def _link_or_copy_file(src_file: str, dst_file: str):
+    # shutil.copy2 already uses os.sendfile on Linux, so the copy stays in kernel space
+    if os.path.basename(src_file).startswith("chroma.sqlite3"):  # The sqlite DB and its -wal/-shm files
+        shutil.copy2(src_file, dst_file)
+        return
+    try:
+        os.link(src_file, dst_file)
+    except OSError:
+        shutil.copy2(src_file, dst_file)
 
-    tmp_contents = os.listdir(dst_chroma_path)
-    if len(tmp_contents) == 0:
-        logger.info(f"Copying ChromaDB from {CHROMA_PATH} to {dst_chroma_path}")
-        os.makedirs(dst_chroma_path, exist_ok=True)
-        shutil.copytree(CHROMA_PATH, dst_chroma_path, dirs_exist_ok=True)
-    else:
-        logger.info(f"ChromaDB already exists in {dst_chroma_path}")
 
 def get_runtime_chroma_path():
-    if IS_USING_IMAGE_RUNTIME:
-        return f"/tmp/{CHROMA_PATH}"
-    else:
-        return CHROMA_PATH
\ No newline at end of file
+    return RUNTIME_CHROMA_PATH
+
+
+# Initialize during import so a SnapStart snapshot captures the loaded DB
+if os.environ.get("SNAPSTART_INIT", "").lower() in ("1", "true", "yes"):
+    get_chroma_db()
@@ -0,0 +1,21 @@
+"""Shared pytest fixtures."""
+
+import pytest
+from hypothesis import settings
+from hypothesis.database import DirectoryBasedExampleDatabase
+from pydantic import TypeAdapter
+import sys
+sys.path.insert(0, 'src')
+
+from api_handler import SubmitQueryRequest
+
+# Select with: pytest --hypothesis-profile=ci
+settings.register_profile(
+    "ci", max_examples=50, database=DirectoryBasedExampleDatabase(".hypothesis")
+)
+
+
+@pytest.fixture(scope="session")
+def query_validator():
+    """Validator for SubmitQueryRequest, with its schema built once per test session."""
+    return TypeAdapter(SubmitQueryRequest)
@@ -0,0 +1,264 @@
+"""Tests for chunking documents before they are added to the database.
+
+Run with: pytest test/test_add_to_database.py -v
+"""
+
+import asyncio
+import logging
+import pytest
+import sys
+sys.path.insert(0, 'src')
+
+from langchain_core.documents import Document
+from rag_app import add_to_database as add_module
+from rag_app.add_to_database import chunk_documents, calculate_chunk_ids, token_length, CHUNK_SIZE
+from rag_app.utils import content_hash
+
+
+@pytest.fixture
+def character_length(monkeypatch):
+    """Measure length in characters so tests don't need to download the tokenizer."""
+    monkeypatch.setattr("rag_app.add_to_database.token_length", len)
+
+
+@pytest.fixture
+def document():
+    """Create a document of ten paragraphs, each 40% of the chunk size."""
+    paragraphs = [chr(ord("a") + i) * (CHUNK_SIZE * 2 // 5) for i in range(10)]
+    return Document(
+        page_content="\n\n".join(paragraphs),
+        metadata={"source": "src/data/source/manual.pdf", "page": 0},
+    )
+
+
+@pytest.mark.usefixtures("character_length")
+class TestChunkDocuments:
+    """Test splitting documents into chunks."""
+
+    def test_chunk_count_is_stable(self, document):
+        """Test that paragraphs are packed two to a chunk."""
+        chunks = chunk_documents([document])
+        assert len(chunks) == 5
+
+    def test_chunks_within_size_limit(self, document):
+        """Test that no chunk exceeds the configured chunk size."""
+        chunks = chunk_documents([document])
+        assert all(len(chunk.page_content) <= CHUNK_SIZE for chunk in chunks)
+
+    def test_chunks_split_on_paragraphs(self, document):
+        """Test that chunk boundaries fall between paragraphs."""
+        chunks = chunk_documents([document])
+        paragraph_length = CHUNK_SIZE * 2 // 5
+        assert chunks[0].page_content == "a" * paragraph_length + "\n\n" + "b" * paragraph_length
+
+
+@pytest.fixture(scope="module")
+def tokenizer_available():
+    """Skip when the tokenizer can't be downloaded, e.g. when running offline."""
+    from rag_app.add_to_database import get_tokenizer
+    try:
+        get_tokenizer()
+    except Exception as e:
+        pytest.skip(f"Tokenizer not available: {e}")
+
+
+@pytest.fixture
+def english_document():
+    """Create a few pages of ordinary English prose."""
+    sentence = "The seat can be moved forwards by lifting the lever under the front edge. "
+    paragraphs = [sentence * (i % 7 + 1) for i in range(40)]
+    return Document(
+        page_content="\n\n".join(paragraphs),
+        metadata={"source": "src/data/source/manual.pdf", "page": 0},
+    )
+
+
+@pytest.mark.usefixtures("tokenizer_available")
+class TestChunkDocumentsWithTokenizer:
+    """Test chunk sizes measured with the real tokenizer."""
+
+    def test_chunks_within_token_limit(self, english_document):
+        """Test that no chunk exceeds the configured number of tokens."""
+        chunks = chunk_documents([english_document])
+        assert all(token_length(chunk.page_content) <= CHUNK_SIZE for chunk in chunks)
+
+    def test_chunks_within_embedding_character_limit(self, english_document):
+        """Test that chunks stay under Cohere embed's 2048 character limit."""
+        chunks = chunk_documents([english_document])
+        assert all(len(chunk.page_content) <= 2048 for chunk in chunks)
+
+
+@pytest.mark.usefixtures("character_length")
+class TestCalculateChunkIds:
+    """Test chunk ID and content hash generation."""
+
+    def test_ids_include_source_page_and_index(self, document):
+        """Test that IDs are in the form source:page:index."""
+        chunks = calculate_chunk_ids(chunk_documents([document]))
+        assert chunks[0].metadata["id"] == "src/data/source/manual.pdf:0:0"
+        assert chunks[1].metadata["id"] == "src/data/source/manual.pdf:0:1"
+
+    def test_content_hash_changes_with_content(self, document):
+        """Test that different chunk content gives a different hash."""
+        chunks = calculate_chunk_ids(chunk_documents([document]))
+        assert chunks[0].metadata["content_hash"] != chunks[1].metadata["content_hash"]
+
+
+class StubDB:
+    """Stands in for the Chroma store, holding chunk IDs and their content hashes."""
+
+    def __init__(self, existing_hashes):
+        self.existing_hashes = existing_hashes
+        self.deleted = []
+
+    def get(self, include):
+        ids = list(self.existing_hashes)
+        return {"ids": ids, "metadatas": [{"content_hash": self.existing_hashes[i]} for i in ids]}
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+
+
+@pytest.fixture
+def stub_db(monkeypatch):
+    """Patch add_to_database to use a StubDB and record the chunks added in each call."""
+    db = StubDB({})
+    added = []
+    monkeypatch.setattr(add_module, "get_embedding_function", lambda: None)
+    monkeypatch.setattr(add_module, "Chroma", lambda **kwargs: db)
+    monkeypatch.setattr(
+        add_module, "add_in_batches", lambda _, chunks: added.append([c.metadata["id"] for c in chunks])
+    )
+    return db, added
+
+
+def make_chunk(index, text):
+    """Create a chunk for the given page of manual.pdf."""
+    return Document(page_content=text, metadata={"source": "manual.pdf", "page": index})
+
+
+class TestAddToDatabase:
+    """Test sorting chunks into new, changed and unchanged."""
+
+    def test_new_changed_and_unchanged_chunks(self, stub_db):
+        """Test that new chunks are added, changed ones replaced and unchanged ones skipped."""
+        db, added = stub_db
+        db.existing_hashes = {
+            "manual.pdf:0:0": content_hash("unchanged"),
+            "manual.pdf:1:0": content_hash("old text"),
+        }
+        add_module.add_to_database([
+            make_chunk(0, "unchanged"),
+            make_chunk(1, "new text"),
+            make_chunk(2, "brand new"),
+        ])
+
+        assert db.deleted == ["manual.pdf:1:0"]
+        assert added == [["manual.pdf:1:0"], ["manual.pdf:2:0"]]
+
+    def test_nothing_added_when_unchanged(self, stub_db):
+        """Test that an ingest with no changes adds and deletes nothing."""
+        db, added = stub_db
+        db.existing_hashes = {"manual.pdf:0:0": content_hash("unchanged")}
+        add_module.add_to_database([make_chunk(0, "unchanged")])
+
+        assert db.deleted == []
+        assert added == []
+
+    def test_chunks_without_hash_are_replaced(self, stub_db):
+        """Test that chunks stored before hashes were recorded are re-embedded."""
+        db, added = stub_db
+        db.existing_hashes = {"manual.pdf:0:0": None}
+        add_module.add_to_database([make_chunk(0, "unchanged")])
+
+        assert db.deleted == ["manual.pdf:0:0"]
+        assert added == [["manual.pdf:0:0"]]
+
+
+class FakeEmbedder:
+    """Embeds each text as [len(text)], failing any batch that contains "fail"."""
+
+    async def aembed_documents(self, texts):
+        if "fail" in texts:
+            raise RuntimeError("Bedrock throttled")
+        return [[float(len(text))] for text in texts]
+
+
+class FakeCollection:
+    """Records every add call."""
+
+    def __init__(self):
+        self.added = []
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.added.append({"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas})
+
+
+class CountingEmbedder(FakeEmbedder):
+    """Records the most batches being embedded at the same time."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return await super().aembed_documents(texts)
+
+
+class FakeDB:
+    """Stands in for the Chroma store with a fake embedder and collection."""
+
+    def __init__(self, embeddings=None):
+        self.embeddings = embeddings or FakeEmbedder()
+        self._collection = FakeCollection()
+
+
+class TestAddInBatches:
+    """Test embedding and writing chunks in batches."""
+
+    def test_failed_batch_logged_and_skipped(self, monkeypatch, caplog):
+        """Test that other batches are still written when one batch fails to embed."""
+        monkeypatch.setattr(add_module, "BATCH_SIZE", 2)
+        texts = ["a", "bb", "fail", "dddd", "eeeee"]
+        chunks = [Document(page_content=text, metadata={"id": f"id{i}"}) for i, text in enumerate(texts)]
+        db = FakeDB()
+
+        with caplog.at_level(logging.ERROR, logger="rag_app.add_to_database"):
+            add_module.add_in_batches(db, chunks)
+
+        added = sorted(db._collection.added, key=lambda batch: batch["ids"])
+        assert added == [
+            {
+                "ids": ["id0", "id1"],
+                "embeddings": [[1.0], [2.0]],
+                "documents": ["a", "bb"],
+                "metadatas": [{"id": "id0"}, {"id": "id1"}],
+            },
+            {
+                "ids": ["id4"],
+                "embeddings": [[5.0]],
+                "documents": ["eeeee"],
+                "metadatas": [{"id": "id4"}],
+            },
+        ]
+        assert "Error adding batch starting at chunk 2: Bedrock throttled" in caplog.text
+
+    def test_concurrency_bounded(self, monkeypatch):
+        """Test that at most EMBEDDING_CONCURRENCY batches are embedded at once."""
+        monkeypatch.setattr(add_module, "BATCH_SIZE", 1)
+        monkeypatch.setattr(add_module, "EMBEDDING_CONCURRENCY", 3)
+        chunks = [Document(page_content="a", metadata={"id": f"id{i}"}) for i in range(10)]
+        db = FakeDB(CountingEmbedder())
+
+        add_module.add_in_batches(db, chunks)
+
+        assert db.embeddings.max_in_flight == 3
+        assert len(db._collection.added) == 10
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
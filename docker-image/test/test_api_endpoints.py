@@ -51,6 +51,18 @@ class TestRootEndpoint:
         assert "submit_query" in response.text.lower()
         assert "query" in response.text.lower()
 
+    def test_get_root_returns_cache_headers(self, client):
+        """Test that GET / returns an ETag and Cache-Control header."""
+        response = client.get("/")
+        assert "etag" in response.headers
+        assert "max-age" in response.headers["cache-control"]
+
+    def test_get_root_matching_etag_returns_304(self, client):
+        """Test that a matching If-None-Match header returns 304 Not Modified."""
+        etag = client.get("/").headers["etag"]
+        response = client.get("/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
 
 class TestSubmitQueryEndpoint:
     """Test the POST /submit_query endpoint."""
@@ -0,0 +1,83 @@
+"""Tests for the query response cache.
+
+Run with: pytest test/test_query_cache.py -v
+"""
+
+import pytest
+import sys
+sys.path.insert(0, 'src')
+
+from rag_app.query_cache import QueryCache
+
+
+class TestExactCache:
+    """Test exact-match lookups on the query text."""
+
+    def test_miss_returns_none(self):
+        """Test that an unknown query is a cache miss."""
+        cache = QueryCache()
+        assert cache.get_exact("What is the maximum speed?") is None
+
+    def test_hit_returns_response(self):
+        """Test that a stored query is returned on an exact match."""
+        cache = QueryCache()
+        cache.put("What is the maximum speed?", None, "100 mph")
+        assert cache.get_exact("What is the maximum speed?") == "100 mph"
+
+    def test_least_recently_used_evicted(self):
+        """Test that the least recently used query is evicted when full."""
+        cache = QueryCache(exact_size=2)
+        cache.put("a", None, "A")
+        cache.put("b", None, "B")
+        cache.get_exact("a")
+        cache.put("c", None, "C")
+
+        assert cache.get_exact("a") == "A"
+        assert cache.get_exact("b") is None
+        assert cache.get_exact("c") == "C"
+
+
+class TestSemanticCache:
+    """Test similarity lookups on the query embedding."""
+
+    def test_empty_cache_returns_none(self):
+        """Test that an empty cache is a miss."""
+        cache = QueryCache()
+        assert cache.get_similar([1.0, 0.0]) is None
+
+    def test_similar_embedding_hits(self):
+        """Test that an embedding above the threshold is a hit."""
+        cache = QueryCache(threshold=0.97)
+        cache.put("What is the maximum speed?", [1.0, 0.0], "100 mph")
+        assert cache.get_similar([0.99, 0.01]) == "100 mph"
+
+    def test_dissimilar_embedding_misses(self):
+        """Test that an embedding below the threshold is a miss."""
+        cache = QueryCache(threshold=0.97)
+        cache.put("What is the maximum speed?", [1.0, 0.0], "100 mph")
+        assert cache.get_similar([0.0, 1.0]) is None
+
+    def test_least_recently_used_evicted(self):
+        """Test that the least recently used embedding is evicted when full."""
+        cache = QueryCache(semantic_size=2)
+        cache.put("a", [1.0, 0.0, 0.0], "A")
+        cache.put("b", [0.0, 1.0, 0.0], "B")
+        cache.get_similar([1.0, 0.0, 0.0])
+        cache.put("c", [0.0, 0.0, 1.0], "C")
+
+        assert cache.get_similar([1.0, 0.0, 0.0]) == "A"
+        assert cache.get_similar([0.0, 1.0, 0.0]) is None
+        assert cache.get_similar([0.0, 0.0, 1.0]) == "C"
+
+    def test_clear_empties_both_levels(self):
+        """Test that clear removes exact and semantic entries."""
+        cache = QueryCache()
+        cache.put("a", [1.0, 0.0], "A")
+        cache.clear()
+
+        assert cache.get_exact("a") is None
+        assert cache.get_similar([1.0, 0.0]) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
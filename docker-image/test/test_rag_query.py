@@ -0,0 +1,217 @@
+"""Tests for the RAG query path, with Chroma and Bedrock stubbed out.
+
+Run with: pytest test/test_rag_query.py -v
+"""
+
+import io
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, Mock
+import sys
+sys.path.insert(0, 'src')
+
+from rag_app import query
+from rag_app.query import retrieve, invoke_model, answer_query, query_rag_many, QueryResponse
+from rag_app.query_cache import QueryCache
+
+
+class StubCollection:
+    """Returns n candidates where candidate i is the one-hot vector e_i."""
+
+    def __init__(self, n):
+        self.n = n
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        return {
+            "documents": [[f"doc {i}" for i in range(self.n)]],
+            "metadatas": [[{"id": f"id{i}"} for i in range(self.n)]],
+            "embeddings": [[[1.0 if j == i else 0.0 for j in range(8)] for i in range(self.n)]],
+        }
+
+
+class StubBedrockClient:
+    """Records invoke_model calls and answers with a fixed Titan response."""
+
+    def __init__(self, output_text):
+        self.output_text = output_text
+        self.calls = []
+
+    def invoke_model(self, **kwargs):
+        self.calls.append(kwargs)
+        body = json.dumps({"results": [{"outputText": self.output_text}]}).encode()
+        return {"body": io.BytesIO(body)}
+
+
+class StubQueryEmbeddings:
+    """Embeds each new text as the next one-hot vector, so no two texts are similar."""
+
+    def __init__(self):
+        self.calls = []
+        self.seen = {}
+
+    def embed_queries(self, texts):
+        self.calls.append(list(texts))
+        vectors = []
+        for text in texts:
+            index = self.seen.setdefault(text, len(self.seen))
+            vectors.append([1.0 if j == index else 0.0 for j in range(16)])
+        return vectors
+
+
+@pytest.fixture
+def query_cache(monkeypatch):
+    """Give each test an empty query cache."""
+    cache = QueryCache(exact_size=16, semantic_size=16)
+    monkeypatch.setattr(query, "QUERY_CACHE", cache)
+    return cache
+
+
+@pytest.fixture
+def embeddings():
+    """Patch the embedding function so no embedding model is called."""
+    embeddings = StubQueryEmbeddings()
+    with patch('rag_app.query.get_embedding_function', return_value=embeddings):
+        yield embeddings
+
+
+@pytest.fixture
+def mock_answer_query():
+    """Patch answer_query to answer each query with its own text."""
+    def answer(query_text, embedding):
+        return QueryResponse(query_text=query_text, response_text=f"answer to {query_text}", sources=[])
+
+    with patch('rag_app.query.answer_query', side_effect=answer) as mock:
+        yield mock
+
+
+class TestRetrieve:
+    """Test the native Chroma search and MMR re-rank."""
+
+    def test_fetches_candidates_with_embeddings(self):
+        """Test that FETCH_K candidates are requested along with their embeddings."""
+        collection = StubCollection(8)
+        with patch('rag_app.query.get_chroma_collection', return_value=collection):
+            retrieve([1.0] + [0.0] * 7)
+
+        call = collection.calls[0]
+        assert call["n_results"] == query.FETCH_K
+        assert "embeddings" in call["include"]
+
+    def test_selects_top_k_aligned_results(self):
+        """Test that TOP_K results are returned, best match first, with matching metadatas."""
+        collection = StubCollection(8)
+        with patch('rag_app.query.get_chroma_collection', return_value=collection):
+            documents, metadatas = retrieve([1.0] + [0.0] * 7)
+
+        assert len(documents) == query.TOP_K
+        assert documents[0] == "doc 0"
+        assert len(set(documents)) == query.TOP_K
+        assert [m["id"] for m in metadatas] == [d.replace("doc ", "id") for d in documents]
+
+    def test_empty_collection(self):
+        """Test that an empty collection returns no documents or metadatas."""
+        with patch('rag_app.query.get_chroma_collection', return_value=StubCollection(0)):
+            assert retrieve([1.0] + [0.0] * 7) == ([], [])
+
+
+class TestInvokeModel:
+    """Test the Titan request and response handling."""
+
+    def test_request_body(self):
+        """Test that the prompt is sent in Titan's User/Bot format."""
+        client = StubBedrockClient("The maximum speed is 100 mph.")
+        with patch('rag_app.query.get_bedrock_client', return_value=client):
+            invoke_model("What is the maximum speed?")
+
+        call = client.calls[0]
+        assert call["modelId"] == query.MODEL_ID
+        assert json.loads(call["body"]) == {"inputText": "\n\nUser: What is the maximum speed?\n\nBot:"}
+
+    def test_response_parsed(self):
+        """Test that the output text is read from the first result."""
+        client = StubBedrockClient("The maximum speed is 100 mph.")
+        with patch('rag_app.query.get_bedrock_client', return_value=client):
+            assert invoke_model("What is the maximum speed?") == "The maximum speed is 100 mph."
+
+
+class TestAnswerQuery:
+    """Test building the prompt and response from retrieved documents."""
+
+    @patch('rag_app.query.invoke_model', return_value="The maximum speed is 100 mph.")
+    @patch('rag_app.query.retrieve', return_value=(["doc a", "doc b"], [{"id": "a.pdf:1:0"}, None]))
+    def test_prompt_and_sources(self, mock_retrieve, mock_invoke_model):
+        """Test that documents are joined into the prompt and source IDs taken from metadata."""
+        response = answer_query("What is the maximum speed?", [0.1, 0.2])
+
+        prompt = mock_invoke_model.call_args.args[0]
+        assert "doc a\n\n---\n\ndoc b" in prompt
+        assert "What is the maximum speed?" in prompt
+        assert response.query_text == "What is the maximum speed?"
+        assert response.response_text == "The maximum speed is 100 mph."
+        assert response.sources == ["a.pdf:1:0", None]
+
+
+@pytest.mark.usefixtures("query_cache")
+class TestQueryRagMany:
+    """Test answering a batch of queries."""
+
+    def test_unique_texts_embedded_in_one_call(self, embeddings, mock_answer_query):
+        """Test that duplicate queries are embedded once, in a single embed_queries call."""
+        query_rag_many(["a", "b", "a", "c", "b"])
+        assert embeddings.calls == [["a", "b", "c"]]
+
+    def test_one_answer_per_unique_text(self, embeddings, mock_answer_query):
+        """Test that answer_query runs once for each unique query."""
+        query_rag_many(["a", "b", "a", "c", "b"])
+
+        assert mock_answer_query.call_count == 3
+        assert sorted(call.args[0] for call in mock_answer_query.call_args_list) == ["a", "b", "c"]
+
+    def test_output_aligned_with_inputs(self, embeddings, mock_answer_query):
+        """Test that responses come back in input order, duplicates included."""
+        responses = query_rag_many(["a", "b", "a", "c", "b"])
+        assert [r.response_text for r in responses] == [
+            "answer to a", "answer to b", "answer to a", "answer to c", "answer to b"
+        ]
+
+    def test_exact_cache_hits_not_embedded(self, query_cache, embeddings, mock_answer_query):
+        """Test that exact cache hits are served without being embedded or answered again."""
+        cached = QueryResponse(query_text="a", response_text="cached a", sources=[])
+        query_cache.put("a", None, cached)
+
+        responses = query_rag_many(["a", "b"])
+
+        assert embeddings.calls == [["b"]]
+        assert [call.args[0] for call in mock_answer_query.call_args_list] == ["b"]
+        assert responses[0] is cached
+
+    def test_all_cached_skips_embedding(self, query_cache, embeddings, mock_answer_query):
+        """Test that nothing is embedded when every query is in the exact cache."""
+        query_cache.put("a", None, QueryResponse(query_text="a", response_text="cached a", sources=[]))
+
+        assert query_rag_many(["a", "a"])[1].response_text == "cached a"
+        assert embeddings.calls == []
+        mock_answer_query.assert_not_called()
+
+    def test_single_query_skips_thread_pool(self, embeddings, mock_answer_query):
+        """Test that a single uncached query is answered without a thread pool."""
+        with patch('rag_app.query.ThreadPoolExecutor') as mock_executor:
+            responses = query_rag_many(["a", "a"])
+
+        mock_executor.assert_not_called()
+        assert [r.response_text for r in responses] == ["answer to a", "answer to a"]
+
+    def test_several_queries_use_thread_pool(self, embeddings, mock_answer_query):
+        """Test that several uncached queries are answered in a pool sized to the work."""
+        executor = Mock(wraps=ThreadPoolExecutor)
+        with patch('rag_app.query.ThreadPoolExecutor', executor):
+            query_rag_many(["a", "b", "c"])
+
+        executor.assert_called_once_with(max_workers=3)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,320 @@
+"""Tests for the shared RAG utilities.
+
+Run with: pytest test/test_utils.py -v
+"""
+
+import gc
+import io
+import json
+import logging
+import os
+import warnings
+import pytest
+import httpx
+from langchain_core.embeddings import Embeddings
+import sys
+sys.path.insert(0, 'src')
+
+from rag_app import utils
+from rag_app.utils import (
+    COHERE_MAX_TEXTS, CachedEmbeddings, CohereBedrockEmbeddings, InfinityEmbeddings, copy_chroma_to_tmp
+)
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeds each text as [len(text)] and records every text it is asked to embed."""
+
+    def __init__(self):
+        self.document_calls = []
+        self.query_calls = []
+
+    def embed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        self.query_calls.append(text)
+        return [float(len(text))]
+
+
+class FakeBatchEmbeddings(FakeEmbeddings):
+    """FakeEmbeddings that can also embed several queries in one call."""
+
+    def __init__(self):
+        super().__init__()
+        self.query_batches = []
+
+    def embed_queries(self, texts):
+        self.query_batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def fake():
+    """Create a fake embeddings model."""
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def cached(fake, tmp_path):
+    """Wrap the fake model in a CachedEmbeddings backed by a temporary sqlite file."""
+    return CachedEmbeddings(fake, "fake-model", cache_path=str(tmp_path / "cache.sqlite3"))
+
+
+class TestCachedDocumentEmbeddings:
+    """Test the sqlite cache in front of embed_documents."""
+
+    def test_hits_and_misses_logged(self, cached, caplog):
+        """Test that the first call misses and a repeat call is served from the cache."""
+        with caplog.at_level(logging.INFO, logger="rag_app.utils"):
+            cached.embed_documents(["a", "bb"])
+            cached.embed_documents(["a", "bb", "ccc"])
+
+        assert "0 hits, 2 misses" in caplog.text
+        assert "2 hits, 1 misses" in caplog.text
+
+    def test_only_misses_sent_to_model(self, cached, fake):
+        """Test that cached texts are not embedded again."""
+        cached.embed_documents(["a", "bb"])
+        cached.embed_documents(["a", "bb", "ccc"])
+        assert fake.document_calls == [["a", "bb"], ["ccc"]]
+
+    def test_duplicate_texts_embedded_once(self, cached, fake):
+        """Test that repeated texts in one call are embedded only once."""
+        vectors = cached.embed_documents(["a", "bb", "a"])
+        assert fake.document_calls == [["a", "bb"]]
+        assert vectors == [[1.0], [2.0], [1.0]]
+
+    def test_order_preserved(self, cached):
+        """Test that vectors come back in input order when hits and misses are mixed."""
+        cached.embed_documents(["bb", "dddd"])
+        vectors = cached.embed_documents(["ccc", "bb", "a", "dddd"])
+        assert vectors == [[3.0], [2.0], [1.0], [4.0]]
+
+    def test_cache_persists_across_instances(self, fake, tmp_path):
+        """Test that a new instance on the same file reuses stored vectors."""
+        cache_path = str(tmp_path / "cache.sqlite3")
+        CachedEmbeddings(fake, "fake-model", cache_path=cache_path).embed_documents(["a"])
+        CachedEmbeddings(fake, "fake-model", cache_path=cache_path).embed_documents(["a"])
+        assert fake.document_calls == [["a"]]
+
+    def test_connection_closed(self, cached):
+        """Test that no sqlite connection is left open after embedding."""
+        # Collect garbage left by earlier tests so only these calls are checked
+        gc.collect()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            cached.embed_documents(["a", "bb"])
+            cached.embed_documents(["a"])
+            # Unclosed connections warn when they are collected
+            gc.collect()
+
+        assert not [w for w in caught if issubclass(w.category, ResourceWarning) and "sqlite3" in str(w.message)]
+
+    def test_lookups_batched_by_500_keys(self, cached, monkeypatch):
+        """Test that cache lookups are split into batches of at most 500 keys."""
+        selects = []
+        connect = cached._connect
+
+        def record_select(statement):
+            # Bound keys are expanded into the traced SQL, each in single quotes
+            if statement.startswith("SELECT"):
+                selects.append(statement.count("'") // 2)
+
+        def traced_connect():
+            conn = connect()
+            conn.set_trace_callback(record_select)
+            return conn
+
+        monkeypatch.setattr(cached, "_connect", traced_connect)
+        texts = [f"text {i}" for i in range(1200)]
+        cached.embed_documents(texts)
+
+        assert sorted(selects) == [200, 500, 500]
+        assert cached.embed_documents(texts) == [[float(len(text))] for text in texts]
+
+
+class TestCachedQueryEmbeddings:
+    """Test the in-memory LRU in front of query embeddings."""
+
+    def test_repeat_query_served_from_cache(self, cached, fake):
+        """Test that a repeated query is only embedded once."""
+        cached.embed_query("a")
+        cached.embed_query("a")
+        assert fake.query_calls == ["a"]
+
+    def test_least_recently_used_evicted(self, cached, fake):
+        """Test that the least recently used query is evicted when the LRU is full."""
+        cached._query_cache_size = 2
+        cached.embed_query("a")
+        cached.embed_query("bb")
+        cached.embed_query("a")
+        cached.embed_query("ccc")
+
+        cached.embed_query("a")
+        cached.embed_query("bb")
+        assert fake.query_calls == ["a", "bb", "ccc", "bb"]
+
+    def test_embed_queries_uses_batch_method(self, tmp_path):
+        """Test that the underlying embed_queries is used when available, once per unique text."""
+        fake = FakeBatchEmbeddings()
+        cached = CachedEmbeddings(fake, "fake-model", cache_path=str(tmp_path / "cache.sqlite3"))
+        assert cached.embed_queries(["a", "bb", "a"]) == [[1.0], [2.0], [1.0]]
+        assert fake.query_batches == [["a", "bb"]]
+
+
+class StubCohereClient:
+    """Records invoke_model request bodies and embeds each text as [len(text)]."""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke_model(self, **kwargs):
+        self.calls.append(kwargs)
+        texts = json.loads(kwargs["body"])["texts"]
+        body = json.dumps({"embeddings": [[float(len(text))] for text in texts]}).encode()
+        return {"body": io.BytesIO(body)}
+
+
+class TestCohereBedrockEmbeddings:
+    """Test the Cohere embed client on Bedrock."""
+
+    def test_documents_split_by_max_texts(self):
+        """Test that documents are sent in requests of at most COHERE_MAX_TEXTS, in order."""
+        client = StubCohereClient()
+        texts = ["a" * (i % 7 + 1) for i in range(COHERE_MAX_TEXTS * 2 + 1)]
+
+        vectors = CohereBedrockEmbeddings(client, "cohere.embed-english-v3").embed_documents(texts)
+
+        batches = [json.loads(call["body"])["texts"] for call in client.calls]
+        assert [len(batch) for batch in batches] == [COHERE_MAX_TEXTS, COHERE_MAX_TEXTS, 1]
+        assert sum(batches, []) == texts
+        assert vectors == [[float(len(text))] for text in texts]
+
+    def test_request_body(self):
+        """Test the model ID, content types, input_type and truncation sent for documents."""
+        client = StubCohereClient()
+        CohereBedrockEmbeddings(client, "cohere.embed-english-v3").embed_documents(["manual"])
+
+        call = client.calls[0]
+        assert call["modelId"] == "cohere.embed-english-v3"
+        assert call["accept"] == call["contentType"] == "application/json"
+        assert json.loads(call["body"]) == {
+            "texts": ["manual"], "input_type": "search_document", "truncate": "END"
+        }
+
+    def test_queries_use_search_query(self):
+        """Test that queries are embedded with the search_query input_type."""
+        client = StubCohereClient()
+        embeddings = CohereBedrockEmbeddings(client, "cohere.embed-english-v3")
+
+        assert embeddings.embed_query("speed") == [5.0]
+        assert embeddings.embed_queries(["a", "bb"]) == [[1.0], [2.0]]
+        assert {json.loads(call["body"])["input_type"] for call in client.calls} == {"search_query"}
+
+
+@pytest.fixture
+def infinity_requests():
+    """Record the inputs sent to a mock Infinity server.
+
+    The server embeds each text as [len(text)] and returns the items in reverse
+    order, so clients must re-order them by index.
+    """
+    requests = []
+
+    def handler(request):
+        texts = json.loads(request.content)["input"]
+        requests.append(texts)
+        data = [{"index": i, "embedding": [float(len(text))]} for i, text in enumerate(texts)]
+        return httpx.Response(200, json={"data": data[::-1]})
+
+    return requests, httpx.MockTransport(handler)
+
+
+class TestInfinityEmbeddings:
+    """Test the Infinity embedding server client."""
+
+    def test_documents_sent_in_sub_batches(self, infinity_requests):
+        """Test that documents are split into batch_size requests and returned in order."""
+        requests, transport = infinity_requests
+        embeddings = InfinityEmbeddings(
+            "http://infinity", "model", document_prefix="", batch_size=2, transport=transport
+        )
+
+        vectors = embeddings.embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+
+        assert sorted(requests) == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+        assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+
+    def test_response_reordered_by_index(self, infinity_requests):
+        """Test that vectors are matched to texts by index, not response order."""
+        _, transport = infinity_requests
+        embeddings = InfinityEmbeddings("http://infinity", "model", query_prefix="", transport=transport)
+        assert embeddings.embed_queries(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+
+    def test_task_prefixes_added(self, infinity_requests):
+        """Test that documents and queries get the nomic task prefixes by default."""
+        requests, transport = infinity_requests
+        embeddings = InfinityEmbeddings("http://infinity", "model", transport=transport)
+
+        embeddings.embed_documents(["manual"])
+        embeddings.embed_query("speed")
+
+        assert requests == [["search_document: manual"], ["search_query: speed"]]
+
+
+@pytest.fixture
+def chroma_paths(tmp_path, monkeypatch):
+    """Create a small Chroma directory and point the source and runtime paths at tmp_path."""
+    src = tmp_path / "chroma"
+    (src / "segment").mkdir(parents=True)
+    (src / "chroma.sqlite3").write_text("sqlite")
+    (src / "segment" / "data_level0.bin").write_text("index")
+    dst = tmp_path / "runtime" / "chroma"
+    monkeypatch.setattr(utils, "CHROMA_PATH", str(src))
+    monkeypatch.setattr(utils, "RUNTIME_CHROMA_PATH", str(dst))
+    return src, dst
+
+
+class TestCopyChromaToTmp:
+    """Test copying the DB to the writable runtime path."""
+
+    def test_copies_tree_and_writes_sentinel(self, chroma_paths):
+        """Test that every file is copied and the source mtime is recorded."""
+        src, dst = chroma_paths
+        copy_chroma_to_tmp()
+
+        assert (dst / "chroma.sqlite3").read_text() == "sqlite"
+        assert (dst / "segment" / "data_level0.bin").read_text() == "index"
+        assert (dst / ".copied_from_mtime").read_text() == str(os.path.getmtime(src))
+
+    def test_up_to_date_copy_reused(self, chroma_paths, monkeypatch):
+        """Test that a copy with a matching sentinel is not copied again."""
+        copy_chroma_to_tmp()
+        monkeypatch.setattr(utils, "link_or_copy_tree", lambda *args: pytest.fail("copied again"))
+        copy_chroma_to_tmp()
+
+    def test_stale_copy_replaced(self, chroma_paths):
+        """Test that a copy from another source mtime is removed and copied again."""
+        src, dst = chroma_paths
+        dst.mkdir(parents=True)
+        (dst / ".copied_from_mtime").write_text("0")
+        (dst / "stale.bin").write_text("stale")
+
+        copy_chroma_to_tmp()
+
+        assert not (dst / "stale.bin").exists()
+        assert (dst / "chroma.sqlite3").read_text() == "sqlite"
+        assert (dst / ".copied_from_mtime").read_text() == str(os.path.getmtime(src))
+
+    def test_sqlite_copied_and_index_hardlinked(self, chroma_paths):
+        """Test that chroma.sqlite3 is a real copy while index files are hardlinked."""
+        src, dst = chroma_paths
+        copy_chroma_to_tmp()
+
+        assert not os.path.samefile(src / "chroma.sqlite3", dst / "chroma.sqlite3")
+        assert os.path.samefile(src / "segment" / "data_level0.bin", dst / "segment" / "data_level0.bin")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,6 +1,9 @@
 """Pytest tests for input validation.
 
 Run with: pytest test/test_validation.py -v
+
+The test classes share no mutable state, so with pytest-xdist installed they
+can run in parallel with: pytest test/test_validation.py -n auto --dist=loadscope
 """
 
 import pytest
@@ -8,228 +11,238 @@ from pydantic import ValidationError
 import sys
 sys.path.insert(0, 'src')
 
-from api_handler import SubmitQueryRequest
+# (input, expected after stripping)
+_VALID = (
+    ("What is the maximum speed?", "What is the maximum speed?"),
+    ("How does this work?", "How does this work?"),
+    ("Can you explain the features?", "Can you explain the features?"),
+    ("What are the specifications?", "What are the specifications?"),
+    ("Tell me about the system.", "Tell me about the system."),
+    ("What is the price?", "What is the price?"),
+    ("How much does it cost?", "How much does it cost?"),
+    ("Can I use this for production?", "Can I use this for production?"),
+)
+
+_MALICIOUS = (
+    "SELECT * FROM users",
+    "<script>alert('xss')</script>",
+    "<img src=x onerror=alert(1)>",
+    "onclick=alert(1)",
+    "onerror=alert(1)",
+)
+
+_INVALID_CHARS = (
+    "What is this? 😊",
+    "Hello\x00World",
+    "price is $500",
+    "temp = 50°C",
+    "What about @mentions?",
+    "Check #hashtags",
+    "100% correct",
+    "this & that",
+    "less < more",
+    "more > less",
+)
+
+_BOUNDARY = (
+    "a",  # Minimum length (1 char)
+    "?" * 10,  # Multiple punctuation
+    "ABC123",  # Mixed alphanumeric
+    "How's it going?",  # Apostrophe
+    "Test: one, two, three.",  # Colons and commas
+    "What is 1/2 or 1/3?",  # Division operator
+    "Price (approx.)",  # Parentheses and period
+)
+
+# Long inputs are built once rather than in every test
+_LONG_A = "a" * 2001
+_LONG_X = "x" * 2001
+_MAX_LEN_QUERY = ("What is this thing? " * 100)[:2000]  # Varied characters, exactly 2000 long
+_TOO_LONG_QUERY = "What is this thing? " * 101  # Varied characters, 2020 long
+
+
+def _expect_err(fn, *args, **kwargs) -> ValidationError:
+    """Call fn and return the ValidationError it raises, failing if it doesn't raise one."""
+    try:
+        fn(*args, **kwargs)
+    except ValidationError as e:
+        return e
+    raise AssertionError("expected ValidationError")
+
+
+def _first_msg(err: ValidationError) -> str:
+    """Return the lowercased message of the single error SubmitQueryRequest raises."""
+    return err.errors(include_url=False, include_input=False)[0]["msg"].lower()
 
 
 class TestValidQueries:
     """Test that valid queries are accepted."""
 
-    @pytest.mark.parametrize("query_text", [
-        "What is the maximum speed?",
-        "How does this work?",
-        "Can you explain the features?",
-        "What are the specifications?",
-        "Tell me about the system.",
-        "What is the price?",
-        "How much does it cost?",
-        "Can I use this for production?",
-    ])
-    def test_valid_query_accepted(self, query_text):
+    def test_valid_queries_batch(self, query_validator):
         """Test that valid queries are accepted without errors."""
-        request = SubmitQueryRequest(query_text=query_text)
-        assert request.query_text == query_text.strip()
+        for query_text, expected in _VALID:
+            request = query_validator.validate_python({"query_text": query_text})
+            assert request.query_text == expected, query_text
 
-    def test_whitespace_stripped(self):
+    def test_whitespace_stripped(self, query_validator):
         """Test that leading/trailing whitespace is stripped."""
-        request = SubmitQueryRequest(query_text="  What is this?  ")
+        request = query_validator.validate_python({"query_text": "  What is this?  "})
         assert request.query_text == "What is this?"
 
-    def test_query_with_punctuation(self):
+    def test_query_with_punctuation(self, query_validator):
         """Test queries with various punctuation marks."""
         query = "What's the difference between A, B, and C?"
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": query})
         assert request.query_text == query
 
-    def test_query_with_parentheses(self):
+    def test_query_with_parentheses(self, query_validator):
         """Test query with parentheses."""
         query = "What is the speed? (in mph)"
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": query})
         assert request.query_text == query
 
-    def test_query_with_division(self):
+    def test_query_with_division(self, query_validator):
         """Test query with division operator."""
         query = "How much is 1/2 of 100?"
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": query})
         assert request.query_text == query
 
-    def test_query_with_colon(self):
+    def test_query_with_colon(self, query_validator):
         """Test query with colons."""
         query = "Test: one, two, three."
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": query})
         assert request.query_text == query
 
 
 class TestInvalidQueries:
     """Test that invalid queries are rejected."""
 
-    def test_empty_query_rejected(self):
+    def test_empty_query_rejected(self, query_validator):
         """Test that empty queries are rejected."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text="")
+        err = _expect_err(query_validator.validate_python, {"query_text": ""})
 
-        errors = exc_info.value.errors()
-        assert any("at least 1 character" in str(error['msg']).lower() for error in errors)
+        assert "at least 1 character" in _first_msg(err)
 
-    def test_whitespace_only_rejected(self):
+    def test_whitespace_only_rejected(self, query_validator):
         """Test that whitespace-only queries are rejected."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text="   ")
+        err = _expect_err(query_validator.validate_python, {"query_text": "   "})
 
-        errors = exc_info.value.errors()
-        assert any("empty" in str(error['msg']).lower() for error in errors)
+        assert "empty" in _first_msg(err)
 
-    def test_too_long_query_rejected(self):
+    # Explicit ids stop pytest building node ids from the full 2000+ character strings
+    @pytest.mark.parametrize(
+        "query_text", (_LONG_A, _TOO_LONG_QUERY), ids=lambda v: f"len={len(v)}"
+    )
+    def test_too_long_query_rejected(self, query_validator, query_text):
         """Test that queries exceeding 2000 characters are rejected."""
-        long_query = "a" * 2001
-
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text=long_query)
+        err = _expect_err(query_validator.validate_python, {"query_text": query_text})
 
-        errors = exc_info.value.errors()
-        assert any("2000" in str(error['msg']) for error in errors)
+        assert "2000" in _first_msg(err)
 
-    def test_max_length_allowed(self):
+    def test_max_length_allowed(self, query_validator):
         """Test that exactly 2000 characters is allowed."""
-        # Use varied characters
-        query = "What is this thing? " * 100  # ~2000 characters
-        query = query[:2000]
-
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": _MAX_LEN_QUERY})
         assert len(request.query_text) <= 2000
 
 
 class TestSecurityValidation:
     """Test that malicious inputs are blocked."""
 
-    @pytest.mark.parametrize("malicious_query", [
-        "SELECT * FROM users",
-        "<script>alert('xss')</script>",
-        "<img src=x onerror=alert(1)>",
-        "onclick=alert(1)",
-        "onerror=alert(1)",
-    ])
-    def test_injection_attacks_blocked(self, malicious_query):
+    @pytest.mark.parametrize("malicious_query", _MALICIOUS)
+    def test_injection_attacks_blocked(self, query_validator, malicious_query):
         """Test that common injection attacks are blocked by character whitelist."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text=malicious_query)
+        err = _expect_err(query_validator.validate_python, {"query_text": malicious_query})
 
-        errors = exc_info.value.errors()
+        errors = err.errors(include_url=False, include_input=False)
         assert len(errors) > 0
 
-    @pytest.mark.parametrize("invalid_char_query", [
-        "What is this? 😊",  
-        "Hello\x00World", 
-        "price is $500", 
-        "temp = 50°C", 
-        "What about @mentions?",
-        "Check #hashtags",  
-        "100% correct", 
-        "this & that", 
-        "less < more", 
-        "more > less",  
-    ])
-    def test_invalid_characters_blocked(self, invalid_char_query):
+    @pytest.mark.parametrize("invalid_char_query", _INVALID_CHARS)
+    def test_invalid_characters_blocked(self, query_validator, invalid_char_query):
         """Test that queries with invalid characters are blocked."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text=invalid_char_query)
+        err = _expect_err(query_validator.validate_python, {"query_text": invalid_char_query})
 
-        errors = exc_info.value.errors()
-        assert any("invalid character" in str(error['msg']).lower() for error in errors)
+        assert "invalid character" in _first_msg(err)
 
 
 class TestEdgeCases:
     """Test edge cases and boundary conditions."""
 
-    def test_single_character_allowed(self):
+    def test_single_character_allowed(self, query_validator):
         """Test that a single character query is allowed."""
-        request = SubmitQueryRequest(query_text="a")
+        request = query_validator.validate_python({"query_text": "a"})
         assert request.query_text == "a"
 
-    def test_numbers_only_allowed(self):
+    def test_numbers_only_allowed(self, query_validator):
         """Test that numeric-only queries are allowed."""
-        request = SubmitQueryRequest(query_text="12345")
+        request = query_validator.validate_python({"query_text": "12345"})
         assert request.query_text == "12345"
 
-    def test_question_mark_only(self):
+    def test_question_mark_only(self, query_validator):
         """Test query with only punctuation."""
-        request = SubmitQueryRequest(query_text="?")
+        request = query_validator.validate_python({"query_text": "?"})
         assert request.query_text == "?"
 
-    def test_mixed_case_preserved(self):
+    def test_mixed_case_preserved(self, query_validator):
         """Test that mixed case is preserved."""
         query = "What is the IoT Device?"
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": query})
         assert request.query_text == query
 
-    def test_multiple_spaces_allowed(self):
+    def test_multiple_spaces_allowed(self, query_validator):
         """Test that multiple spaces are allowed."""
         query = "What  is  this?"  # Double spaces
-        request = SubmitQueryRequest(query_text=query)
+        request = query_validator.validate_python({"query_text": query})
         assert request.query_text == query
 
-    @pytest.mark.parametrize("boundary_query", [
-        "a",  # Minimum length (1 char)
-        "?" * 10,  # Multiple punctuation
-        "ABC123",  # Mixed alphanumeric
-        "How's it going?",  # Apostrophe
-        "Test: one, two, three.",  # Colons and commas
-        "What is 1/2 or 1/3?",  # Division operator
-        "Price (approx.)",  # Parentheses and period
-    ])
-    def test_boundary_cases(self, boundary_query):
+    def test_boundary_cases_batch(self, query_validator):
         """Test various boundary cases."""
-        request = SubmitQueryRequest(query_text=boundary_query)
-        assert request.query_text == boundary_query.strip()
+        for boundary_query in _BOUNDARY:
+            request = query_validator.validate_python({"query_text": boundary_query})
+            assert request.query_text == boundary_query.strip(), boundary_query
 
 
 class TestValidationMessages:
     """Test that validation error messages are helpful."""
 
-    def test_empty_query_error_message(self):
+    def test_empty_query_error_message(self, query_validator):
         """Test error message for empty query is descriptive."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text="")
+        err = _expect_err(query_validator.validate_python, {"query_text": ""})
 
-        error_msg = str(exc_info.value)
-        assert "1 character" in error_msg or "at least" in error_msg
+        msg0 = _first_msg(err)
+        assert "1 character" in msg0 or "at least" in msg0
 
-    def test_invalid_character_error_message(self):
+    def test_invalid_character_error_message(self, query_validator):
         """Test error message for invalid characters is descriptive."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text="test $$$")
+        err = _expect_err(query_validator.validate_python, {"query_text": "test $$$"})
 
-        error_msg = str(exc_info.value)
-        assert "invalid character" in error_msg.lower()
+        assert "invalid character" in _first_msg(err)
 
-    def test_too_long_error_message(self):
+    def test_too_long_error_message(self, query_validator):
         """Test error message for too-long query is descriptive."""
-        with pytest.raises(ValidationError) as exc_info:
-            SubmitQueryRequest(query_text="x" * 2001)
+        err = _expect_err(query_validator.validate_python, {"query_text": _LONG_X})
 
-        error_msg = str(exc_info.value)
-        assert "2000" in error_msg
+        assert "2000" in _first_msg(err)
 
 
 class TestValidationIntegration:
     """Integration tests for validation in the full request flow."""
 
-    def test_validation_runs_before_processing(self):
+    def test_validation_runs_before_processing(self, query_validator):
         """Test that validation happens before any processing."""
         # This would fail early due to validation, not during query processing
-        with pytest.raises(ValidationError):
-            SubmitQueryRequest(query_text="<script>alert(1)</script>")
+        _expect_err(query_validator.validate_python, {"query_text": "<script>alert(1)</script>"})
 
-    def test_valid_query_creates_proper_request(self):
+    def test_valid_query_creates_proper_request(self, query_validator):
         """Test that valid input creates a proper request object."""
-        request = SubmitQueryRequest(query_text="What is this?")
+        request = query_validator.validate_python({"query_text": "What is this?"})
 
         assert hasattr(request, 'query_text')
         assert isinstance(request.query_text, str)
         assert len(request.query_text) > 0
 
-    def test_validation_is_case_insensitive_for_content(self):
+    def test_validation_is_case_insensitive_for_content(self, query_validator):
         """Test that case is preserved in queries."""
-        request = SubmitQueryRequest(query_text="What is AWS?")
+        request = query_validator.validate_python({"query_text": "What is AWS?"})
         assert request.query_text == "What is AWS?"
 
 
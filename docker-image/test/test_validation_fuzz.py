@@ -0,0 +1,42 @@
+"""Property-based tests for input validation.
+
+Failing examples are saved to .hypothesis/ and replayed first on the next run.
+Run with: pytest test/test_validation_fuzz.py -v
+In CI, use the smaller "ci" profile from conftest.py: pytest --hypothesis-profile=ci
+"""
+
+import pytest
+from hypothesis import given, strategies as st
+from pydantic import ValidationError
+import sys
+sys.path.insert(0, 'src')
+
+# Every generated query contains at least one character outside the whitelist
+invalid_char_queries = st.builds(
+    lambda before, bad, after: before + bad + after,
+    st.text(max_size=50),
+    st.sampled_from("$@#%&<>°"),
+    st.text(max_size=50),
+)
+
+
+class TestValidationFuzz:
+    """Test the validator against generated inputs."""
+
+    @given(query_text=invalid_char_queries)
+    def test_invalid_chars_blocked_fuzz(self, query_validator, query_text):
+        """Test that any query containing a disallowed character is rejected."""
+        with pytest.raises(ValidationError):
+            query_validator.validate_python({"query_text": query_text})
+
+    @given(query_text=st.from_regex(r"[a-zA-Z0-9 ?.!,;:'\"\-()/]{1,100}", fullmatch=True))
+    def test_whitelisted_queries_accepted_fuzz(self, query_validator, query_text):
+        """Test that any non-blank query made only of whitelisted characters is accepted."""
+        if not query_text.strip():
+            return
+        request = query_validator.validate_python({"query_text": query_text})
+        assert request.query_text == query_text.strip()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,68 @@
+"""Tests for warming up the RAG query path.
+
+Run with: pytest test/test_warm_up.py -v
+"""
+
+import pytest
+from unittest.mock import patch, Mock
+import sys
+sys.path.insert(0, 'src')
+
+from rag_app import query
+from api_handler import handler
+
+
+@pytest.fixture(autouse=True)
+def not_warmed_up(monkeypatch):
+    """Start each test with a process that hasn't warmed up yet."""
+    monkeypatch.setattr(query, "IS_WARMED_UP", False)
+
+
+@pytest.fixture
+def mock_embedding_function():
+    """Patch the embedding function so no Bedrock call is made."""
+    embedding_function = Mock()
+    embedding_function.embed_query.return_value = [0.1, 0.2]
+    with patch('rag_app.query.get_embedding_function', return_value=embedding_function):
+        yield embedding_function
+
+
+class TestWarmUp:
+    """Test the one-off warm-up query."""
+
+    @patch('rag_app.query.answer_query')
+    def test_warm_up_runs_query_once(self, mock_answer_query, mock_embedding_function):
+        """Test that warm_up answers one query and is a no-op afterwards."""
+        query.warm_up()
+        query.warm_up()
+
+        mock_answer_query.assert_called_once_with("warmup", [0.1, 0.2])
+        assert query.IS_WARMED_UP
+
+    @patch('rag_app.query.answer_query')
+    def test_warm_up_failure_is_logged_not_raised(self, mock_answer_query, mock_embedding_function, caplog):
+        """Test that a failed warm-up doesn't raise and leaves the process not warmed up."""
+        mock_answer_query.side_effect = Exception("Bedrock unavailable")
+
+        query.warm_up()
+
+        assert not query.IS_WARMED_UP
+        assert "Warm up failed" in caplog.text
+
+    @patch('rag_app.query.answer_query')
+    def test_warm_up_bypasses_query_cache(self, mock_answer_query, mock_embedding_function):
+        """Test that the warm-up answer is not stored in the query cache."""
+        query.warm_up()
+        assert query.QUERY_CACHE.get_exact("warmup") is None
+
+
+class TestLambdaHandler:
+    """Test how the Lambda entry point is configured."""
+
+    def test_lifespan_disabled(self):
+        """Test that Mangum doesn't run the app lifespan inside each invocation."""
+        assert handler.lifespan == "off"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])